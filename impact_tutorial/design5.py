@@ -3,8 +3,11 @@ import casadi as ca
 import numpy as np
 import rockit
 import impact
+import shutil
 
-rockit.GlobalOptions.set_cmake_flags(['-G','Ninja','-DCMAKE_C_COMPILER=clang','-DCMAKE_CXX_COMPILER=clang'])
+# Only ask for the Ninja generator when ninja is on the PATH: with '-G Ninja' and no ninja, the CMake call fails
+generator = ['-G','Ninja'] if shutil.which('ninja') else []
+rockit.GlobalOptions.set_cmake_flags(generator+['-DCMAKE_C_COMPILER=clang','-DCMAKE_CXX_COMPILER=clang'])
 rockit.GlobalOptions.set_cmake_build_type('Release')
 
 mpc = impact.MPC(T=0.5)
@@ -36,65 +39,65 @@ ee = ca.vertcat(furuta.ee_x, furuta.ee_y, furuta.ee_z)
 pivot = ca.vertcat(furuta.pivot_x, furuta.pivot_y, furuta.pivot_z)
 
 # Transcription choice
-method = external_method('acados', N=25,qp_solver='PARTIAL_CONDENSING_HPIPM',nlp_solver_max_iter=200,hessian_approx='EXACT',regularize_method = 'CONVEXIFY',integrator_type='ERK',nlp_solver_type='SQP',qp_solver_cond_N=5)
+N = 25
+# Partially condense the QP to blocks of 5 stages (short horizons end up fully condensed)
+qp_solver_cond_N = max(1, N//5)
+method = external_method('acados', N=N,qp_solver='PARTIAL_CONDENSING_HPIPM',nlp_solver_max_iter=200,hessian_approx='EXACT',regularize_method = 'CONVEXIFY',integrator_type='ERK',nlp_solver_type='SQP',qp_solver_cond_N=qp_solver_cond_N)
 mpc.method(method)
 
 # Solve
 sol = mpc.solve()
 
+# rockit's acados driver does not report the solver status: at least check that the solution reaches x_final
+[_, xsol] = sol.sample(furuta.x, grid='control')
+assert np.allclose(xsol[-1], [np.pi/3,0,0,0], atol=1e-4), "acados did not converge to x_final"
+
 
 from pylab import *
+from matplotlib.collections import LineCollection
 
 
 [ts, theta2sol] = sol.sample(furuta.theta2, grid='control')
-[ts_fine, theta2sol_fine] = sol.sample(furuta.theta2, grid='control')
 
 [ts, dtheta2sol] = sol.sample(furuta.dtheta2, grid='control')
-[ts_fine, dtheta2sol_fine] = sol.sample(furuta.dtheta2, grid='control')
 
 print("theta2sol",theta2sol)
 
 figure()
-plot(ts, theta2sol,'b.')
-plot(ts_fine, theta2sol_fine,'b')
-plot(ts, dtheta2sol,'g.')
-plot(ts_fine, dtheta2sol_fine,'g')
+plot(ts, theta2sol,'b.-')
+plot(ts, dtheta2sol,'g.-')
 xlabel('Time [s]')
 ylabel('theta2')
 
 [ts, Torque1sol] = sol.sample(furuta.Torque1, grid='control')
-[ts_fine, Torque1sol_fine] = sol.sample(furuta.Torque1, grid='control')
 
 figure()
-plot(ts, Torque1sol,'b.')
-plot(ts_fine, Torque1sol_fine,'b')
+plot(ts, Torque1sol,'b.-')
 xlabel('Time [s]')
 ylabel('Torque [N]')
 
-figure()
-
-
-[_,ee_sol_fine] = sol.sample(ee,grid='control')
 [_,ee_sol] = sol.sample(ee,grid='control')
 [_,pivot_sol] = sol.sample(pivot,grid='control')
 
-
 [_,theta1_sol] = sol.sample(furuta.theta1,grid='control')
-[_,theta2_sol] = sol.sample(furuta.theta2,grid='control')
+
+figure()
 
 xlabel("theta1")
 ylabel("theta2")
-plot(theta1_sol,theta2_sol)
+plot(theta1_sol,theta2sol)
 
 axis('square')
 
 figure()
 
-plot(ee_sol_fine[:,1],ee_sol_fine[:,2])
+plot(ee_sol[:,1],ee_sol[:,2])
 plot(ee_sol[:,1],ee_sol[:,2],'k.')
 
-for k in range(ee_sol.shape[0]):
-    plot([ee_sol[k,1],pivot_sol[k,1]],[ee_sol[k,2],pivot_sol[k,2]],'k-')
+# Pendulum rods, one (ee, pivot) segment per sample
+rods = np.stack((ee_sol[:,1:3],pivot_sol[:,1:3]),axis=1)
+gca().add_collection(LineCollection(rods,colors='k'))
+autoscale()
 
 axis('square')
 show()
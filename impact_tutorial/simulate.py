@@ -20,40 +20,60 @@ ax[0].set_xlabel('Sample')
 
 print("Running MPC simulation loop")
 
-history = []
-runtime = []
+n_samples = 1000
+nx = x_opt.shape[0]
 
+history = np.empty((nx, n_samples))
+runtime = np.empty(n_samples)
 
-for i in range(1000):
+# Draw all artificial noise up front
+noise = np.random.normal(0, 0.001, size=(nx, n_samples))
+
+# ctypes view on the solver's stats struct: refreshed in place by every solve
+stats = impact.get_stats()
+
+prev_sign = None
+
+for i in range(n_samples):
 
   mark = ((i//300) % 2 == 0)
   sign = (mark-0.5)*2
 
-  impact.set("p", "x_final", impact.EVERYWHERE, impact.FULL, [sign*np.pi/3,0,0,0])
+  # Target only changes every 300 samples
+  if sign != prev_sign:
+    impact.set("p", "x_final", impact.EVERYWHERE, impact.FULL, [sign*np.pi/3,0,0,0])
+    prev_sign = sign
 
   impact.solve()
   
-  runtime.append(impact.get_stats().runtime*1000)
+  runtime[i] = stats.runtime*1000
+
+  # Warm-start the next solve with the current solution, shifted by one sample
+  x_guess = impact.get("x_opt", impact.ALL, impact.EVERYWHERE, impact.FULL)
+  u_guess = impact.get("u_opt", impact.ALL, impact.EVERYWHERE, impact.FULL)
+  impact.set("x_initial_guess", impact.ALL, impact.EVERYWHERE, impact.FULL, np.hstack((x_guess[:,1:],x_guess[:,-1:])))
+  impact.set("u_initial_guess", impact.ALL, impact.EVERYWHERE, impact.FULL, np.hstack((u_guess[:,1:],u_guess[:,-1:])))
 
   # Optimal input at k=0
-  u = impact.get("u_opt", impact.ALL, 0, impact.FULL)
+  u = u_guess[:,0:1]
 
   # Simulate 1 step forward in time (ask MPC prediction model)
-  x_sim = impact.get("x_opt", impact.ALL, 1, impact.FULL)
+  # Copy: a column of x_guess is strided, while Impact.set hands the raw buffer to C
+  x_sim = x_guess[:,1:2].copy()
   
   # Add some artificial noise
-  x_sim+= np.random.normal(0, 0.001, size=(x_sim.shape[0],1))
+  x_sim+= noise[:,i:i+1]
 
   # Update current state
   impact.set("x_current", impact.ALL, 0, impact.FULL, x_sim)
-  history.append(x_sim)
+  history[:,i] = x_sim[:,0]
 
 # More plotting
-ax[1].plot(np.hstack(history).T)
+ax[1].plot(history.T)
 ax[1].set_title('Simulated MPC')
 ax[1].set_xlabel('Sample')
 
-ax[2].plot(np.hstack(runtime).T)
+ax[2].plot(runtime)
 ax[2].set_title('Runtime [ms]')
 ax[2].set_xlabel('Sample')
 plt.show()
@@ -2,47 +2,62 @@
 Furuta-pendulum
 =============
 """
+import os
+# Batch run: keep this process and the exported hello worlds off GUI backends
+os.environ["MPLBACKEND"] = "Agg"
+
 from impact import *
 import casadi as ca
 import numpy as np
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import rockit
 
 rockit.GlobalOptions.set_cmake_flags(['-G','Ninja','-DCMAKE_C_COMPILER=clang','-DCMAKE_CXX_COMPILER=clang'])
 
-mpc = MPC(T=3.0)
+
+# Furuta swing-up problem, shared by all solvers below.
+# Build a fresh MPC per export: MPC.export accumulates helper functions on the object.
+def build_mpc():
+    mpc = MPC(T=3.0)
+
+    furuta_pendulum = mpc.add_model('fu_pendulum','furuta.yaml')
+
+    print(furuta_pendulum.ee_x)
+    ## Parameters
+    x_current = mpc.parameter('x_current',furuta_pendulum.nx)
+    x_final = mpc.parameter('x_final',furuta_pendulum.nx)
 
 
-furuta_pendulum = mpc.add_model('fu_pendulum','furuta.yaml')
+    ## Objectives
+    # mpc.add_objective(mpc.sum(furuta_pendulum.Torque1**2 + furuta_pendulum.Torque2**2))
+    mpc.add_objective(mpc.sum(furuta_pendulum.Torque1**2 ))
 
-print(furuta_pendulum.ee_x)
-## Parameters
-x_current = mpc.parameter('x_current',furuta_pendulum.nx)
-x_final = mpc.parameter('x_final',furuta_pendulum.nx)
+    # Initial and final state constraints
+    mpc.subject_to(mpc.at_t0(furuta_pendulum.x)==x_current)
+    mpc.subject_to(mpc.at_tf(furuta_pendulum.x)==x_final)
 
+    # Torque limits
+    mpc.subject_to(-40 <= (furuta_pendulum.Torque1 <= 40 ))
+    # Constraint to only one turn 
+    mpc.subject_to(-ca.pi<= (furuta_pendulum.theta1 <= ca.pi), include_first=False)
 
-## Objectives
-mpc.add_objective(mpc.sum(furuta_pendulum.Torque1**2 ))
 
-# Initial and final state constraints
-mpc.subject_to(mpc.at_t0(furuta_pendulum.x)==x_current)
-mpc.subject_to(mpc.at_tf(furuta_pendulum.x)==x_final)
+    ee = ca.vertcat(furuta_pendulum.ee_x, furuta_pendulum.ee_y, furuta_pendulum.ee_z)
+    pivot = ca.vertcat(furuta_pendulum.pivot_x, furuta_pendulum.pivot_y, furuta_pendulum.pivot_z)
 
-# Torque limits
-mpc.subject_to(-40 <= (furuta_pendulum.Torque1 <= 40 ))
-# Constraint to only one turn 
-mpc.subject_to(-ca.pi<= (furuta_pendulum.theta1 <= ca.pi), include_first=False)
+    kinematics = ca.Function('kinematics',[furuta_pendulum.x],[ee,pivot])
+    ee_nominal, pivot_nominal = kinematics([0,0,0,0])
+    print("ee_nominal",ee_nominal)
 
+    mpc.set_value(x_current, [-np.pi/6,0,0,0]) # Start point
+    mpc.set_value(x_final, [np.pi/6,0,0,0]) # End point
 
-ee = ca.vertcat(furuta_pendulum.ee_x, furuta_pendulum.ee_y, furuta_pendulum.ee_z)
-pivot = ca.vertcat(furuta_pendulum.pivot_x, furuta_pendulum.pivot_y, furuta_pendulum.pivot_z)
+    return mpc, furuta_pendulum
 
-ee_nominal = ca.evalf(ca.substitute(ee,furuta_pendulum.x,[0,0,0,0]))
-pivot_nominal = ca.evalf(ca.substitute(pivot,furuta_pendulum.x,[0,0,0,0]))
 
-mpc.set_value(x_current, [-np.pi/6,0,0,0]) # Start point
-mpc.set_value(x_final, [np.pi/6,0,0,0]) # End point
+mpc, furuta_pendulum = build_mpc()
 
 # Transcription
 method = external_method('acados', N=50,qp_solver='PARTIAL_CONDENSING_HPIPM',nlp_solver_max_iter=200,hessian_approx='EXACT',regularize_method = 'CONVEXIFY',integrator_type='ERK',nlp_solver_type='SQP',qp_solver_cond_N=10)
@@ -53,17 +68,11 @@ mpc.method(method)
 sol = mpc.solve()
 
 mpc.export('torq_obs_aca',short_output=True)
-env = dict(os.environ)
-env["MPLBACKEND"] = "Agg"
-assert subprocess.run(["python","hello_world_torq_obs_aca.py"],env=env,cwd="torq_obs_aca_build_dir").returncode==0
+assert subprocess.run(["python","hello_world_torq_obs_aca.py"],cwd="torq_obs_aca_build_dir").returncode==0
 
 # Sample a state/control trajectory
-tsa, theta1sol = sol.sample(furuta_pendulum.theta1, grid='control')
-tsa, theta2sol = sol.sample(furuta_pendulum.theta2, grid='control')
-tsa, dtheta1sol = sol.sample(furuta_pendulum.dtheta1, grid='control')
-tsa, dtheta2sol = sol.sample(furuta_pendulum.dtheta2, grid='control')
-
-tsb, Torque1sol = sol.sample(furuta_pendulum.Torque1, grid='control')
+tsa, signals = sol.sample(ca.vertcat(furuta_pendulum.theta1, furuta_pendulum.theta2, furuta_pendulum.dtheta1, furuta_pendulum.dtheta2, furuta_pendulum.Torque1), grid='control')
+theta1sol, theta2sol, dtheta1sol, dtheta2sol, Torque1sol = signals.T
 # tsb, Torque2sol = sol.sample(furuta_pendulum.Torque2, grid='control')
 
 print(theta1sol)
@@ -71,6 +80,8 @@ print(theta1sol)
 assert abs(theta1sol[0]-(-0.52359878))<1e-5
 
 
+exported = []
+
 for solver, solver_options in [("fatrop",{
         "expand": True,
         "structure_detection": "auto",
@@ -81,43 +92,10 @@ for solver, solver_options in [("fatrop",{
         "jit_options": {"flags":["-O3","-ffast-math"]}
     }),("ipopt",{}),("sqpmethod",{"qpsol": "osqp"}),("sleqp",{})]:
 
-    mpc = MPC(T=3.0)
-
-    furuta_pendulum = mpc.add_model('fu_pendulum','furuta.yaml')
-
-
-    print(furuta_pendulum.ee_x)
-    ## Parameters
-    x_current = mpc.parameter('x_current',furuta_pendulum.nx)
-    x_final = mpc.parameter('x_final',furuta_pendulum.nx)
-
-
-    ## Objectives
-    # mpc.add_objective(mpc.sum(furuta_pendulum.Torque1**2 + furuta_pendulum.Torque2**2))
-    mpc.add_objective(mpc.sum(furuta_pendulum.Torque1**2 ))
-
-    # Initial and final state constraints
-    mpc.subject_to(mpc.at_t0(furuta_pendulum.x)==x_current)
-    mpc.subject_to(mpc.at_tf(furuta_pendulum.x)==x_final)
-
-    # Torque limits
-    mpc.subject_to(-40 <= (furuta_pendulum.Torque1 <= 40 ))
-    # Constraint to only one turn 
-    mpc.subject_to(-ca.pi<= (furuta_pendulum.theta1 <= ca.pi), include_first=False)
+    mpc, furuta_pendulum = build_mpc()
 
     mpc.solver(solver, solver_options)
 
-    ee = ca.vertcat(furuta_pendulum.ee_x, furuta_pendulum.ee_y, furuta_pendulum.ee_z)
-    pivot = ca.vertcat(furuta_pendulum.pivot_x, furuta_pendulum.pivot_y, furuta_pendulum.pivot_z)
-
-    ee_nominal = ca.evalf(ca.substitute(ee,furuta_pendulum.x,[0,0,0,0]))
-    print("ee_nominal",ee_nominal)
-    pivot_nominal = ca.evalf(ca.substitute(pivot,furuta_pendulum.x,[0,0,0,0]))
-
-
-    mpc.set_value(x_current, [-np.pi/6,0,0,0]) # Start point
-    mpc.set_value(x_final, [np.pi/6,0,0,0]) # End point
-
     # Transcription
     mpc.method(MultipleShooting(N=50,M=1,intg='rk'))
 
@@ -127,18 +105,12 @@ for solver, solver_options in [("fatrop",{
 
 
     mpc.export(f'torq_obs_{solver}',short_output=True)
-    env = dict(os.environ)
-    env["MPLBACKEND"] = "Agg"
-    assert subprocess.run(["python",f"hello_world_torq_obs_{solver}.py"],env=env,cwd=f"torq_obs_{solver}_build_dir").returncode==0
+    exported.append(solver)
 
 
     # Sample a state/control trajectory
-    tsa, theta1sol = sol.sample(furuta_pendulum.theta1, grid='control')
-    tsa, theta2sol = sol.sample(furuta_pendulum.theta2, grid='control')
-    tsa, dtheta1sol = sol.sample(furuta_pendulum.dtheta1, grid='control')
-    tsa, dtheta2sol = sol.sample(furuta_pendulum.dtheta2, grid='control')
-
-    tsb, Torque1sol = sol.sample(furuta_pendulum.Torque1, grid='control')
+    tsa, signals = sol.sample(ca.vertcat(furuta_pendulum.theta1, furuta_pendulum.theta2, furuta_pendulum.dtheta1, furuta_pendulum.dtheta2, furuta_pendulum.Torque1), grid='control')
+    theta1sol, theta2sol, dtheta1sol, dtheta2sol, Torque1sol = signals.T
     # tsb, Torque2sol = sol.sample(furuta_pendulum.Torque2, grid='control')
 
     print(theta1sol)
@@ -146,4 +118,18 @@ for solver, solver_options in [("fatrop",{
     assert abs(theta1sol[0]-(-0.52359878))<1e-5
 
 
+# The exported hello worlds are independent of each other: run them side by side,
+# capturing their output so it can be reported per solver
+def run_hello_world(solver):
+    return solver, subprocess.run(["python",f"hello_world_torq_obs_{solver}.py"],cwd=f"torq_obs_{solver}_build_dir",capture_output=True,text=True)
+
+with ThreadPoolExecutor(max_workers=len(exported)) as executor:
+    results = list(executor.map(run_hello_world, exported))
+
+for solver, result in results:
+    print(f"--- hello_world_torq_obs_{solver}.py ---")
+    print(result.stdout, end='')
+    print(result.stderr, end='')
+    assert result.returncode==0, f"hello_world_torq_obs_{solver}.py failed with return code {result.returncode}"
+
 